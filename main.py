@@ -1,12 +1,44 @@
 # main.py
 
 import os
-import json
+import asyncio
+import threading
 from dotenv import load_dotenv
-from src.agent import KaggleAgent
+from src.agent import KaggleAgent, to_json
 
+try:
+    import readline  # noqa: F401  # Enables line editing and history for input()
+except ImportError:
+    pass
 
-def main():
+
+def async_input(prompt: str) -> asyncio.Future:
+    """
+    Reads a line from stdin without blocking the event loop.
+
+    The read runs in a daemon thread so a pending prompt never keeps the
+    process alive on exit.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def settle(setter, value):
+        if not future.done():
+            setter(value)
+
+    def read():
+        try:
+            line = input(prompt)
+        except BaseException as e:
+            loop.call_soon_threadsafe(settle, future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(settle, future.set_result, line)
+
+    threading.Thread(target=read, daemon=True).start()
+    return future
+
+
+async def main():
     """
     Main function to run the Kaggle Competition Assistant CLI.
     """
@@ -27,34 +59,61 @@ def main():
     print("Available commands: !stats, !history, !logs, !reset")
     print("-" * 50)
 
-    while True:
-        try:
-            user_query = input("You: ")
-            if not user_query:
-                continue
+    # Optionally persist logs to disk in the background while waiting for input
+    log_file = os.getenv("KAGGLE_AGENT_LOG_FILE")
+    flush_task = (
+        asyncio.create_task(agent.flush_logs_periodically(log_file))
+        if log_file
+        else None
+    )
 
-            if user_query.lower() == "exit":
-                print("Goodbye!")
-                break
+    try:
+        while True:
+            try:
+                user_query = await async_input("You: ")
+                if not user_query:
+                    continue
+
+                if user_query.lower() == "exit":
+                    print("Goodbye!")
+                    break
 
-            # Handle special commands
-            if user_query == "!stats":
-                print(json.dumps(agent.get_session_stats(), indent=2))
-            elif user_query == "!history":
-                print(json.dumps(agent.memory.get_full_history(), indent=2))
-            elif user_query == "!logs":
-                print(json.dumps(agent.logger.export_logs(), indent=2))
-            elif user_query == "!reset":
-                agent.reset_session()
-                print("Agent session has been reset.")
-            else:
-                response = agent.run(user_query)
-                print(f"Assistant: {response}")
-
-        except (KeyboardInterrupt, EOFError):
-            print("\nGoodbye!")
-            break
+                # Handle special commands
+                if user_query == "!stats":
+                    print(to_json(agent.get_session_stats(), indent=True))
+                elif user_query == "!history":
+                    print(to_json(agent.memory.get_full_history(), indent=True))
+                elif user_query == "!logs":
+                    print(to_json(agent.logger.export_logs(), indent=True))
+                elif user_query == "!reset":
+                    agent.reset_session()
+                    print("Agent session has been reset.")
+                else:
+                    # The prefix waits for the first token, so tool progress
+                    # printed while the agent works isn't tacked onto it
+                    streamed = False
+
+                    def on_token(text):
+                        nonlocal streamed
+                        if not streamed:
+                            print("Assistant: ", end="")
+                            streamed = True
+                        print(text, end="", flush=True)
+
+                    await agent.run_async(user_query, on_token=on_token)
+                    print()
+
+            except (KeyboardInterrupt, EOFError):
+                print("\nGoodbye!")
+                break
+    finally:
+        if flush_task:
+            flush_task.cancel()
+            await asyncio.gather(flush_task, return_exceptions=True)
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\nGoodbye!")
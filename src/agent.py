@@ -1,60 +1,266 @@
 # src/agent.py
 
+import os
+import sys
 import json
+import asyncio
+import time
+import importlib
+import threading
+from collections import Counter, deque
 from datetime import datetime
-from typing import Dict, List, Any
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Callable, Deque, Dict, List, Optional
 from dataclasses import dataclass, field
 
 import google.generativeai as genai
-from google.generativeai.types import FunctionDeclaration, Tool
-
-from src.tools import (
-    find_similar_competitions,
-    get_winning_solution_writeups,
-    get_top_scoring_kernels,
-    search_code_snippets,
-    analyze_tech_stack,
-    summarize_url_content,
-    get_competition_id_from_url,
+from google.api_core import exceptions as google_exceptions
+from google.generativeai import protos
+from google.generativeai.types import FunctionDeclaration, Tool, generation_types
+
+try:
+    import orjson
+except ImportError:  # Fall back to the standard library encoder
+    orjson = None
+
+from src.cache import ToolFailure, TTLCache
+from src.concurrency import DaemonThreadPoolExecutor
+
+
+def _format_timestamp(ts_ns: int) -> str:
+    """Formats an integer `time.time_ns()` timestamp as an ISO string."""
+    return datetime.fromtimestamp(ts_ns / 1e9).isoformat()
+
+
+def to_json(obj: Any, indent: bool = False) -> str:
+    """Serializes an object to a JSON string, using orjson when it is installed."""
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if indent else 0
+        return orjson.dumps(obj, default=str, option=option).decode()
+    return json.dumps(obj, default=str, indent=2 if indent else None)
+
+
+# Tool declarations are static, so they are built once at import time
+_FUNCTION_DECLARATIONS = [
+    FunctionDeclaration(
+        name="find_similar_competitions",
+        description="Searches for similar competitions.",
+        parameters={
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "Keywords to search for."},
+                "metric": {"type": "string", "description": "Evaluation metric to filter by (optional)."}
+            },
+            "required": ["query"]
+        }
+    ),
+    FunctionDeclaration(
+        name="get_winning_solution_writeups",
+        description="Retrieves winning solution writeups (kernels) for a competition.",
+        parameters={
+            "type": "object",
+            "properties": {
+                "competition_slug": {"type": "string", "description": "The slug of the competition."}
+            },
+            "required": ["competition_slug"]
+        }
+    ),
+    FunctionDeclaration(
+        name="get_top_scoring_kernels",
+        description="Finds top scoring kernels for a competition.",
+        parameters={
+            "type": "object",
+            "properties": {
+                "competition_slug": {"type": "string", "description": "The slug of the competition."},
+                "language": {"type": "string", "description": "Python or R."},
+                "sort_by": {"type": "string", "description": "Votes or PublicScore."}
+            },
+            "required": ["competition_slug"]
+        }
+    ),
+    FunctionDeclaration(
+        name="search_code_snippets",
+        description="Searches for specific code snippets in kernels.",
+        parameters={
+            "type": "object",
+            "properties": {
+                "keywords": {"type": "string", "description": "Code or text to search for."},
+                "competition_slug": {"type": "string", "description": "Competition slug to limit search (optional)."}
+            },
+            "required": ["keywords"]
+        }
+    ),
+    FunctionDeclaration(
+        name="analyze_tech_stack",
+        description="Analyzes the technology stack (libraries) used in top kernels.",
+        parameters={
+            "type": "object",
+            "properties": {
+                "competition_slug": {"type": "string", "description": "The slug of the competition."}
+            },
+            "required": ["competition_slug"]
+        }
+    ),
+    FunctionDeclaration(
+        name="summarize_url_content",
+        description="Fetches and summarizes the content of a URL.",
+        parameters={
+            "type": "object",
+            "properties": {"url": {"type": "string"}},
+            "required": ["url"]
+        },
+    ),
+    FunctionDeclaration(
+        name="web_fetch_many",
+        description="Fetches the text content of several URLs at once. Prefer this over repeated single fetches when reading multiple pages.",
+        parameters={
+            "type": "object",
+            "properties": {"urls": {"type": "array", "items": {"type": "string"}}},
+            "required": ["urls"]
+        },
+    ),
+    FunctionDeclaration(
+        name="get_competition_id_from_url",
+        description="Parses a Kaggle competition URL to find its competition Slug.",
+        parameters={
+            "type": "object",
+            "properties": {"url": {"type": "string"}},
+            "required": ["url"]
+        },
+    ),
+]
+
+_TOOLS = Tool(function_declarations=_FUNCTION_DECLARATIONS)
+
+# Dispatch table from declared tool names to (module, attribute) paths.
+# Tool modules pull in the Kaggle and HTTP client libraries, so they are
+# only imported when a tool is first called.
+_FUNCTION_MAP = MappingProxyType(
+    {
+        "find_similar_competitions": ("src.tools", "find_similar_competitions"),
+        "get_winning_solution_writeups": ("src.tools", "get_winning_solution_writeups"),
+        "get_top_scoring_kernels": ("src.tools", "get_top_scoring_kernels"),
+        "search_code_snippets": ("src.tools", "search_code_snippets"),
+        "analyze_tech_stack": ("src.tools", "analyze_tech_stack"),
+        "summarize_url_content": ("src.tools", "summarize_url_content"),
+        "web_fetch_many": ("src.built_in_tools", "web_fetch_many"),
+        "get_competition_id_from_url": ("src.tools", "get_competition_id_from_url"),
+    }
+)
+
+# Session counters reported by get_session_stats
+_AGENT_STATS = ("queries_processed", "tools_called", "errors")
+
+# Finish reasons that leave the chat session usable; any other (SAFETY,
+# RECITATION, MALFORMED_FUNCTION_CALL, ...) breaks its history
+_OK_FINISH_REASONS = frozenset(
+    {
+        protos.Candidate.FinishReason.FINISH_REASON_UNSPECIFIED,
+        protos.Candidate.FinishReason.STOP,
+        protos.Candidate.FinishReason.MAX_TOKENS,
+    }
 )
 
+# Failures of a chat turn that the session can recover from by dropping the turn
+_CHAT_ERRORS = (
+    generation_types.BrokenResponseError,
+    generation_types.StopCandidateException,
+    generation_types.BlockedPromptException,
+    generation_types.IncompleteIterationError,
+    google_exceptions.GoogleAPIError,
+)
+
+
+@lru_cache(maxsize=None)
+def _get_model(api_key: str, model_name: str) -> genai.GenerativeModel:
+    """Returns a shared model instance for the given API key and model name."""
+    return genai.GenerativeModel(model_name=model_name, tools=[_TOOLS])
+
+
+@dataclass(slots=True)
+class Message:
+    """
+    A single conversation message.
+
+    The timestamp is stored as an integer so the ISO formatting cost is only
+    paid for messages that are actually exported.
+    """
+
+    role: str
+    content: str
+    ts_ns: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the message as a JSON-ready dict."""
+        return {
+            "timestamp": _format_timestamp(self.ts_ns),
+            "role": self.role,
+            "content": self.content,
+        }
+
+
+@dataclass(slots=True)
+class LogEntry:
+    """A single log record, timestamped like `Message`."""
+
+    level: str
+    event: str
+    details: Dict[str, Any]
+    ts_ns: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the log entry as a JSON-ready dict."""
+        return {
+            "timestamp": _format_timestamp(self.ts_ns),
+            "level": self.level,
+            "event": self.event,
+            "details": self.details,
+        }
+
 
 @dataclass
 class ConversationMemory:
     """Manages conversation history and state for a session."""
 
-    messages: List[Dict[str, str]] = field(default_factory=list)
+    messages: Deque[Message] = field(default_factory=deque)
     max_history: int = 20
+    _user_count: int = field(default=0, init=False, repr=False)
+    _assistant_count: int = field(default=0, init=False, repr=False)
+
+    def __post_init__(self):
+        # A bounded deque evicts the oldest message in O(1) once full
+        self.messages = deque(self.messages, maxlen=self.max_history)
+        self._user_count = sum(1 for m in self.messages if m.role == "user")
+        self._assistant_count = sum(1 for m in self.messages if m.role == "assistant")
 
     def add_message(self, role: str, content: str):
         """Adds a message to the conversation history."""
-        self.messages.append(
-            {"role": role, "content": content, "timestamp": datetime.now().isoformat()}
-        )
-        # Trim history if it exceeds the maximum length
-        if len(self.messages) > self.max_history:
-            self.messages = self.messages[-self.max_history :]
-
-    def get_context(self) -> str:
-        """Returns the recent conversation history as a JSON string."""
-        return json.dumps(self.messages[-5:])  # Return last 5 for concise context
+        # Keep the role counters in sync with the message the deque will evict
+        if len(self.messages) == self.messages.maxlen:
+            oldest = self.messages[0].role
+            self._user_count -= oldest == "user"
+            self._assistant_count -= oldest == "assistant"
+        self._user_count += role == "user"
+        self._assistant_count += role == "assistant"
+        self.messages.append(Message(role, content, time.time_ns()))
 
     def get_full_history(self) -> List[Dict[str, str]]:
         """Returns the full conversation history."""
-        return self.messages
+        return [m.to_dict() for m in self.messages]
 
     def clear(self):
         """Clears the conversation history, effectively resetting the session."""
         self.messages.clear()
+        self._user_count = 0
+        self._assistant_count = 0
 
     def get_stats(self) -> Dict[str, int]:
         """Returns statistics about the conversation."""
         return {
             "total_messages": len(self.messages),
-            "user_messages": sum(1 for m in self.messages if m["role"] == "user"),
-            "assistant_messages": sum(
-                1 for m in self.messages if m["role"] == "assistant"
-            ),
+            "user_messages": self._user_count,
+            "assistant_messages": self._assistant_count,
         }
 
 
@@ -62,18 +268,37 @@ class ConversationMemory:
 class AgentLogger:
     """Provides observability into agent operations through logging."""
 
-    logs: List[Dict[str, Any]] = field(default_factory=list)
+    logs: Deque[LogEntry] = field(default_factory=deque)
+    max_logs: int = 10000
+    _info_count: int = field(default=0, init=False, repr=False)
+    _error_count: int = field(default=0, init=False, repr=False)
+    _logged_total: int = field(default=0, init=False, repr=False)
+    _flushed_total: int = field(default=0, init=False, repr=False)
+    # Tool calls log from worker threads
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        # Bound the log buffer so long sessions don't grow memory without limit
+        self.logs = deque(self.logs, maxlen=self.max_logs)
+        self._logged_total = len(self.logs)
+        self._info_count = sum(1 for log in self.logs if log.level == "INFO")
+        self._error_count = sum(1 for log in self.logs if log.level == "ERROR")
 
     def log(self, level: str, event: str, details: Dict[str, Any] = None):
         """Records a log entry."""
-        self.logs.append(
-            {
-                "timestamp": datetime.now().isoformat(),
-                "level": level,
-                "event": event,
-                "details": details or {},
-            }
-        )
+        entry = LogEntry(level, event, details or {}, time.time_ns())
+        with self._lock:
+            # Keep the level counters in sync with the entry the deque will evict
+            if len(self.logs) == self.logs.maxlen:
+                oldest = self.logs[0].level
+                self._info_count -= oldest == "INFO"
+                self._error_count -= oldest == "ERROR"
+            self._info_count += level == "INFO"
+            self._error_count += level == "ERROR"
+            self.logs.append(entry)
+            self._logged_total += 1
 
     def info(self, event: str, **kwargs):
         self.log("INFO", event, kwargs)
@@ -83,15 +308,30 @@ class AgentLogger:
 
     def get_stats(self) -> Dict[str, int]:
         """Returns statistics about the logs."""
-        return {
-            "total_logs": len(self.logs),
-            "info_count": sum(1 for log in self.logs if log["level"] == "INFO"),
-            "error_count": sum(1 for log in self.logs if log["level"] == "ERROR"),
-        }
+        with self._lock:
+            return {
+                "total_logs": len(self.logs),
+                "info_count": self._info_count,
+                "error_count": self._error_count,
+            }
 
     def export_logs(self) -> List[Dict[str, Any]]:
         """Returns all log entries."""
-        return self.logs
+        with self._lock:
+            entries = list(self.logs)
+        return [log.to_dict() for log in entries]
+
+    def flush(self, path: str):
+        """Appends the entries recorded since the last flush to a JSON Lines file."""
+        # Held while writing too, so concurrent flushes append in order
+        with self._lock:
+            pending = min(self._logged_total - self._flushed_total, len(self.logs))
+            self._flushed_total = self._logged_total
+            if pending <= 0:
+                return
+            with open(path, "a", encoding="utf-8") as f:
+                for log in list(self.logs)[-pending:]:
+                    f.write(to_json(log.to_dict()) + "\n")
 
 
 class KaggleAgent:
@@ -101,175 +341,261 @@ class KaggleAgent:
         genai.configure(api_key=api_key)
         self.memory = ConversationMemory()
         self.logger = AgentLogger()
-        self.stats = {"queries_processed": 0, "tools_called": 0, "errors": 0}
-
-        self.function_declarations = [
-            FunctionDeclaration(
-                name="find_similar_competitions",
-                description="Searches for similar competitions.",
-                parameters={
-                    "type": "object",
-                    "properties": {
-                        "query": {"type": "string", "description": "Keywords to search for."},
-                        "metric": {"type": "string", "description": "Evaluation metric to filter by (optional)."}
-                    },
-                    "required": ["query"]
-                }
-            ),
-            FunctionDeclaration(
-                name="get_winning_solution_writeups",
-                description="Retrieves winning solution writeups (kernels) for a competition.",
-                parameters={
-                    "type": "object",
-                    "properties": {
-                        "competition_slug": {"type": "string", "description": "The slug of the competition."}
-                    },
-                    "required": ["competition_slug"]
-                }
-            ),
-            FunctionDeclaration(
-                name="get_top_scoring_kernels",
-                description="Finds top scoring kernels for a competition.",
-                parameters={
-                    "type": "object",
-                    "properties": {
-                        "competition_slug": {"type": "string", "description": "The slug of the competition."},
-                        "language": {"type": "string", "description": "Python or R."},
-                        "sort_by": {"type": "string", "description": "Votes or PublicScore."}
-                    },
-                    "required": ["competition_slug"]
-                }
-            ),
-            FunctionDeclaration(
-                name="search_code_snippets",
-                description="Searches for specific code snippets in kernels.",
-                parameters={
-                    "type": "object",
-                    "properties": {
-                        "keywords": {"type": "string", "description": "Code or text to search for."},
-                        "competition_slug": {"type": "string", "description": "Competition slug to limit search (optional)."}
-                    },
-                    "required": ["keywords"]
-                }
-            ),
-            FunctionDeclaration(
-                name="analyze_tech_stack",
-                description="Analyzes the technology stack (libraries) used in top kernels.",
-                parameters={
-                    "type": "object",
-                    "properties": {
-                        "competition_slug": {"type": "string", "description": "The slug of the competition."}
-                    },
-                    "required": ["competition_slug"]
-                }
-            ),
-            FunctionDeclaration(
-                name="summarize_url_content",
-                description="Fetches and summarizes the content of a URL.",
-                parameters={
-                    "type": "object",
-                    "properties": {"url": {"type": "string"}},
-                    "required": ["url"]
-                },
-            ),
-            FunctionDeclaration(
-                name="get_competition_id_from_url",
-                description="Parses a Kaggle competition URL to find its competition Slug.",
-                parameters={
-                    "type": "object",
-                    "properties": {"url": {"type": "string"}},
-                    "required": ["url"]
-                },
-            ),
-        ]
-
-        self.tools = Tool(function_declarations=self.function_declarations)
-        self.model = genai.GenerativeModel(
-            model_name="models/gemini-2.5-flash", tools=[self.tools]
-        )
+        # Tool calls run on worker threads, so counter updates go through a lock
+        self.stats: Counter = Counter()
+        self._stats_lock = threading.Lock()
+        # Tool results keyed by (name, args)
+        self._tool_cache = TTLCache(maxsize=256, ttl=300)
+        # Worker pools for queries and for running independent tool calls
+        # concurrently. Their workers are daemon threads, so an interrupted
+        # query doesn't delay exit. The chat session isn't thread-safe, so
+        # queries run one at a time.
+        self._query_pool = DaemonThreadPoolExecutor(max_workers=1)
+        self._pool = DaemonThreadPoolExecutor(max_workers=8)
+
+        self.function_declarations = _FUNCTION_DECLARATIONS
+        self.tools = _TOOLS
+        self.model = _get_model(api_key, "models/gemini-2.5-flash")
+        # A single chat session carries the multi-turn history natively. It is
+        # trimmed to the same number of exchanges `memory` keeps, tracked as the
+        # number of history entries each query added.
+        self.chat = self.model.start_chat(history=[])
+        self._committed_history: list = self.chat.history
+        self._turn_lengths: Deque[int] = deque()
         self.logger.info("Agent initialized")
 
+        # Open the API connection in the background so the first query doesn't pay for it
+        if os.getenv("KAGGLE_AGENT_NO_WARMUP") is None:
+            threading.Thread(target=self._warmup, daemon=True).start()
+
+    def _warmup(self):
+        """Issues a cheap, non-billable request to establish the API connection."""
+        try:
+            self.model.count_tokens("hi")
+            self.logger.info("Connection warmup completed")
+        except Exception as e:
+            self.logger.error("Connection warmup failed", error=str(e))
+
+    def _increment_stat(self, name: str):
+        """Atomically increments one of the session counters."""
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _recover_chat(self):
+        """
+        Drops the last exchange from the chat session if it is broken (a stream
+        that failed or stopped early), so the session can keep being used.
+        """
+        try:
+            # The getter returns the session's committed entries, kept in case
+            # the next response can't be rewound
+            self._committed_history = self.chat.history
+        except generation_types.BrokenResponseError:
+            self.chat.rewind()
+        except IndexError:
+            # A response without candidates breaks rewind() too, but it was
+            # never committed, so resetting the history drops it
+            self.chat.history = self._committed_history
+
+    def _end_turn(self, turn_start: int, failed: bool = False):
+        """
+        Records the history entries a query added, discarding them if the turn
+        failed, and trims the oldest exchanges beyond the memory window.
+        """
+        self._recover_chat()
+        history = self.chat.history
+        if failed:
+            # Leave no half-finished tool exchange behind for the next query
+            del history[turn_start:]
+        elif len(history) > turn_start:
+            self._turn_lengths.append(len(history) - turn_start)
+
+        excess = len(self._turn_lengths) - self.memory.max_history // 2
+        if excess > 0:
+            dropped = sum(self._turn_lengths.popleft() for _ in range(excess))
+            self.chat.history = history[dropped:]
+
     def _call_function(self, function_call) -> str:
-        function_map = {
-            "find_similar_competitions": find_similar_competitions,
-            "get_winning_solution_writeups": get_winning_solution_writeups,
-            "get_top_scoring_kernels": get_top_scoring_kernels,
-            "search_code_snippets": search_code_snippets,
-            "analyze_tech_stack": analyze_tech_stack,
-            "summarize_url_content": summarize_url_content,
-            "get_competition_id_from_url": get_competition_id_from_url,
-        }
-        
         func_name = function_call.name
         func_args = function_call.args
-        
-        if func_name in function_map:
+
+        func_path = _FUNCTION_MAP.get(func_name)
+        if func_path is not None:
             try:
                 # Convert args to dict to ensure compatibility
                 args_dict = dict(func_args)
+
+                # Identical calls within the TTL are served from memory
+                key = (func_name, json.dumps(args_dict, sort_keys=True, default=str))
+                cached = self._tool_cache.get(key)
+                if cached is not None:
+                    self.logger.info("Tool cache hit", tool=func_name)
+                    return cached
+
                 self.logger.info("Tool execution started", tool=func_name, args=args_dict)
-                self.stats["tools_called"] += 1
-                result = function_map[func_name](**args_dict)
+                self._increment_stat("tools_called")
+                mod_name, attr = func_path
+                func = getattr(importlib.import_module(mod_name), attr)
+                result = func(**args_dict)
                 self.logger.info("Tool execution successful", tool=func_name)
-                return str(result)
+                result_text = str(result)
+                if not isinstance(result, ToolFailure):
+                    self._tool_cache.set(key, result_text)
+                return result_text
             except Exception as e:
                 self.logger.error("Tool execution failed", tool=func_name, error=str(e))
                 return f"Error executing {func_name}: {e}"
         return f"Unknown function: {func_name}"
 
     def run(self, user_query: str) -> str:
+        """Processes a query and returns the complete response text."""
+        return self.run_streaming(user_query)
+
+    def run_streaming(
+        self, user_query: str, on_token: Optional[Callable[[str], None]] = None
+    ) -> str:
+        """
+        Processes a query, streaming the response text to `on_token` as each
+        chunk arrives, and returns the complete response text.
+        """
         self.logger.info("Query received", query=user_query)
-        self.stats["queries_processed"] += 1
+        self._increment_stat("queries_processed")
+
         self.memory.add_message("user", user_query)
+        # A turn abandoned mid-stream (e.g. on interrupt) may have left the session broken
+        self._recover_chat()
+        turn_start = len(self.chat.history)
+
+        prompt = user_query
+        # Replaces the answer when a turn fails or comes back empty
+        fallback = None
+        # Every piece of text passed to on_token, so memory records the reply as shown
+        shown: List[str] = []
 
-        chat = self.model.start_chat()
-        prompt = f"Based on the conversation so far: {self.memory.get_context()}, process the following query: {user_query}"
+        def emit(text: str):
+            shown.append(text)
+            if on_token:
+                on_token(text)
 
         # ReAct Loop
         while True:
-            response = chat.send_message(prompt)
+            response = None
             try:
+                response = self.chat.send_message(prompt, stream=True)
+                function_calls = []
+                response_text = ""
+                for chunk in response:
+                    # Skip chunks without content (e.g. trailing metadata)
+                    if not chunk.candidates or not chunk.candidates[0].content.parts:
+                        continue
+
+                    for part in chunk.candidates[0].content.parts:
+                        # Function calls can't be streamed, collect them for the tool path
+                        if part.function_call:
+                            function_calls.append(part.function_call)
+                        elif part.text:
+                            response_text += part.text
+                            emit(part.text)
+
+                # Make sure the chat history and usage metadata are finalized
+                response.resolve()
+                # Streaming doesn't check the finish reason, but the history getter will
+                candidate = response.candidates[0] if response.candidates else None
+                if candidate is not None and candidate.finish_reason not in _OK_FINISH_REASONS:
+                    raise generation_types.StopCandidateException(candidate)
+
+                if function_calls:
+                    # Text the model wrote before calling tools stays in the
+                    # reply, with the tool notices starting on their own line
+                    if response_text:
+                        emit("\n")
+                    for function_call in function_calls:
+                        print(f"Tool call: {function_call.name}({dict(function_call.args)})")
+
+                    # The model may plan several independent tool calls at once,
+                    # run them concurrently so latency is bounded by the slowest
+                    futures = [
+                        self._pool.submit(self._call_function, function_call)
+                        for function_call in function_calls
+                    ]
+                    results = [future.result() for future in futures]
+
+                    returned = " ".join(
+                        f"Function {function_call.name} returned: {result}."
+                        for function_call, result in zip(function_calls, results)
+                    )
+                    prompt = f"{returned} What is the next step? If you have a final answer for the user, provide it directly."
+                    continue
+
                 # Handle possible empty response or safety blocks
-                if not response.candidates:
-                     response_text = "I'm sorry, I couldn't generate a response."
-                     break
-                     
-                part = response.candidates[0].content.parts[0]
-
-                if part.function_call:
-                    function_call = part.function_call
-                    print(f"Tool call: {function_call.name}({function_call.args})")
-
-                    result = self._call_function(function_call)
-
-                    prompt = f"Function {function_call.name} returned: {result}. What is the next step? If you have a final answer for the user, provide it directly."
-                else:
-                    response_text = part.text
-                    break
+                if not response_text:
+                    fallback = "I'm sorry, I couldn't generate a response."
+                break
+            except _CHAT_ERRORS as e:
+                fallback = "I'm sorry, I couldn't generate a response."
+                self.logger.error("Chat turn failed", error=str(e))
+                self._increment_stat("errors")
+                break
             except (ValueError, IndexError) as e:
-                response_text = (
-                    response.text
-                    if hasattr(response, "text")
-                    else f"No valid response found. Error: {e}"
-                )
+                fallback = f"No valid response found. Error: {e}"
                 self.logger.error("Response parsing failed", response=str(response))
-                self.stats["errors"] += 1
+                self._increment_stat("errors")
                 break
 
+        self._end_turn(turn_start, failed=fallback is not None)
+        if fallback is not None:
+            # Streamed too, after whatever partial text was already shown
+            if shown and not shown[-1].endswith("\n"):
+                emit("\n")
+            emit(fallback)
+        response_text = "".join(shown)
+
         self.memory.add_message("assistant", response_text)
         self.logger.info("Query completed")
         return response_text
 
+    async def run_async(
+        self, user_query: str, on_token: Optional[Callable[[str], None]] = None
+    ) -> str:
+        """
+        Runs `run_streaming` in a worker thread so the calling event loop stays
+        free for background work while the query is processed.
+        """
+        return await asyncio.wrap_future(
+            self._query_pool.submit(self.run_streaming, user_query, on_token)
+        )
+
+    async def flush_logs_periodically(self, path: str, interval: float = 5.0):
+        """Appends new log entries to `path` every `interval` seconds until cancelled."""
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                self.logger.flush(path)
+        finally:
+            self.logger.flush(path)
+
     def reset_session(self):
         """Resets the agent's memory and stats for a new session."""
         self.memory.clear()
-        self.stats = {"queries_processed": 0, "tools_called": 0, "errors": 0}
+        self.chat = self.model.start_chat(history=[])
+        self._committed_history = self.chat.history
+        self._turn_lengths.clear()
+        self._tool_cache.clear()
+        with self._stats_lock:
+            self.stats.clear()
         self.logger.info("Agent session has been reset.")
 
     def get_session_stats(self) -> Dict[str, Any]:
         """Returns combined statistics for the current session."""
-        return {
-            "agent_stats": self.stats,
+        stats = {
+            "agent_stats": {name: self.stats[name] for name in _AGENT_STATS},
             "memory_stats": self.memory.get_stats(),
             "logger_stats": self.logger.get_stats(),
-        }
\ No newline at end of file
+            "tool_cache_stats": self._tool_cache.get_stats(),
+        }
+        # Only once a tool has loaded the web tools, so !stats doesn't pay for
+        # importing requests and lxml
+        web_tools = sys.modules.get("src.built_in_tools")
+        if web_tools is not None:
+            stats["web_cache_stats"] = web_tools.get_cache_stats()
+        return stats
\ No newline at end of file
@@ -1,8 +1,53 @@
 # src/built_in_tools.py
 
+import codecs
+import hashlib
 import requests
 import re
-from bs4 import BeautifulSoup
+from lxml import html as lhtml
+from requests.adapters import HTTPAdapter
+
+from src.cache import ToolFailure, TTLCache
+from src.concurrency import DaemonThreadPoolExecutor
+
+# Upper bound on downloaded page size, so following a link to a huge page can't exhaust memory
+_MAX_PAGE_BYTES = 2_000_000
+
+# Elements that add noise rather than readable content
+_JUNK_XPATH = "//script|//style|//header|//footer|//nav"
+
+# Finds http or https links in free text
+_URL_RE = re.compile(r"https?://[^\s]+")
+
+# Shared session so repeated fetches reuse pooled keep-alive connections (and skip
+# the TLS handshake). The headers mimic a real browser, which prevents 403 blocks
+# from sites like Wikipedia/Kaggle.
+_SESSION = requests.Session()
+_SESSION.headers.update(
+    {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+    }
+)
+_SESSION.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32))
+_SESSION.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=32))
+
+# Fetched pages and search results. Failures are cached briefly so broken
+# URLs aren't hammered, but can recover quickly.
+_WEB_CACHE = TTLCache(maxsize=256, ttl=3600)
+_SEARCH_CACHE = TTLCache(maxsize=256, ttl=3600)
+_ERROR_TTL = 60
+
+# Clean text keyed on a hash of the raw body, so the same page served under
+# different URLs (mirrors, aliases, tracking parameters) is only parsed once.
+# The content is immutable for a given hash, so entries only age out by LRU.
+_CLEAN_CACHE = TTLCache(maxsize=128, ttl=86400)
+
+# Cache validators (ETag / Last-Modified) and text of fetched pages, kept well past
+# the page cache TTL so an expired page can be revalidated with a conditional GET
+_VALIDATOR_CACHE = TTLCache(maxsize=256, ttl=86400)
+
+# Upper bound on concurrent downloads in web_fetch_many, matching the pool size
+_MAX_CONCURRENT_FETCHES = 16
 
 def web_fetch(prompt: str) -> str:
     """
@@ -16,69 +61,190 @@ def web_fetch(prompt: str) -> str:
         str: The clean text content of the page, or an error message.
     """
     # 1. Extract the URL using Regex (finds http or https links)
-    url_match = re.search(r"(https?://[^\s]+)", prompt)
+    url_match = _URL_RE.search(prompt)
 
     if not url_match:
-        return "Error: No valid URL found in the prompt."
+        return ToolFailure("Error: No valid URL found in the prompt.")
 
     url = url_match.group(0)
 
-    # 2. Set headers to mimic a real browser (prevents 403 blocks from sites like Wikipedia/Kaggle)
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
+    # 2. Serve recently fetched pages from the cache
+    cached = _WEB_CACHE.get(url)
+    if cached is not None:
+        return cached
+
+    text, ok = _fetch_page_text(url)
+    if not ok:
+        text = ToolFailure(text)
+    _WEB_CACHE.set(url, text, ttl=None if ok else _ERROR_TTL)
+    return text
+
+def _fetch_page_text(url: str):
+    """
+    Downloads and cleans a page, returning (text, ok) where ok is False if
+    text is an error message.
+    """
+    # Revalidate a previously fetched copy instead of downloading it again
+    previous = _VALIDATOR_CACHE.get(url)
+    headers = {}
+    if previous is not None:
+        etag, last_modified, _ = previous
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
 
     try:
-        # 3. Make the request with a timeout (don't let the agent hang forever)
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()  # Raises an error for 4xx or 5xx status codes
+        # 3. Stream the response with a timeout (don't let the agent hang forever),
+        # stopping once the size cap is reached
+        with _SESSION.get(url, headers=headers, timeout=10, stream=True) as response:
+            response.raise_for_status()  # Raises an error for 4xx or 5xx status codes
+            if response.status_code == 304 and previous is not None:
+                return previous[2], True  # Not modified, the cached copy is current
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            encoding = _declared_encoding(response)
+            body = bytearray()
+            for chunk in response.iter_content(chunk_size=65536):
+                body.extend(chunk)
+                if len(body) > _MAX_PAGE_BYTES:
+                    break
+
+        # An empty page has no text, and lxml refuses to parse an empty document
+        if not body.strip():
+            return "", True
 
-        # 4. Parse the HTML
-        soup = BeautifulSoup(response.text, "html.parser")
+        # 4. Skip parsing entirely if an identical body was already cleaned
+        # (the declared charset is part of the key, since it changes the decoded text)
+        body_hash = (hashlib.blake2b(body, digest_size=16).digest(), encoding)
+        clean_text = _CLEAN_CACHE.get(body_hash)
+        if clean_text is None:
+            # 5. Parse the raw bytes with the C-based libxml2 parser, which reads
+            # <meta charset> itself; a charset from the headers takes precedence
+            root = lhtml.fromstring(bytes(body), parser=_html_parser(encoding))
 
-        # 5. Remove 'junk' elements (scripts, styles, navbars, footers often add noise)
-        for script_or_style in soup(["script", "style", "header", "footer", "nav"]):
-            script_or_style.decompose()
+            # 6. Remove 'junk' elements (scripts, styles, navbars, footers often add noise),
+            # keeping the text that follows them
+            for element in root.xpath(_JUNK_XPATH):
+                element.drop_tree()
 
-        # 6. Extract text and clean whitespace
-        text = soup.get_text()
+            # 7. Extract text, keeping inline elements (links, emphasis) within their line
+            text = root.text_content()
 
-        # Collapse multiple newlines into one and strip leading/trailing whitespace
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        clean_text = "\n".join(chunk for chunk in chunks if chunk)
+            # Collapse multiple newlines into one and strip leading/trailing whitespace
+            lines = (line.strip() for line in text.splitlines())
+            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+            clean_text = "\n".join(chunk for chunk in chunks if chunk)
 
-        # Optional: Limit length to prevent overflowing the AI's context window
-        return clean_text[:10000]  # Returns first 10k chars
+            # Optional: Limit length to prevent overflowing the AI's context window
+            clean_text = clean_text[:10000]  # Returns first 10k chars
+            _CLEAN_CACHE.set(body_hash, clean_text)
+
+        if etag or last_modified:
+            _VALIDATOR_CACHE.set(url, (etag, last_modified, clean_text))
+        return clean_text, True
 
     except requests.exceptions.HTTPError as http_err:
-        return f"HTTP Error fetching {url}: {http_err}"
+        return f"HTTP Error fetching {url}: {http_err}", False
     except requests.exceptions.ConnectionError:
-        return f"Connection Error: Could not reach {url}."
+        return f"Connection Error: Could not reach {url}.", False
     except requests.exceptions.Timeout:
-        return f"Timeout Error: {url} took too long to respond."
+        return f"Timeout Error: {url} took too long to respond.", False
     except Exception as e:
-        return f"An unexpected error occurred: {str(e)}"
+        return f"An unexpected error occurred: {str(e)}", False
+
+def _declared_encoding(response):
+    """
+    Returns the charset from the Content-Type header, or None if the server
+    didn't send one. Never falls back to `response.apparent_encoding`, which
+    runs charset detection over the whole body.
+    """
+    if "charset=" not in response.headers.get("Content-Type", "").lower():
+        return None
+    return response.encoding
+
+def _html_parser(encoding):
+    """
+    Returns an HTML parser for the encoding (None means detect it from the
+    document). Parsers aren't shared because web_fetch_many uses them from
+    several threads.
+    """
+    if encoding is None:
+        return None
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        return None  # Unknown charset in the headers, let libxml2 detect it
+    return lhtml.HTMLParser(encoding=encoding)
+
+def web_fetch_many(urls: list[str]) -> str:
+    """
+    Fetches several URLs concurrently so the agent can read multiple pages in a
+    single tool call.
+
+    Args:
+        urls (list[str]): The URLs to fetch.
+
+    Returns:
+        str: The clean text of each page (or its error message), labelled by URL.
+    """
+    urls = list(urls)
+    if not urls:
+        return ToolFailure("Error: No URLs provided.")
+
+    # Pages are fetched in parallel over the shared session; results keep the input order
+    with DaemonThreadPoolExecutor(max_workers=min(_MAX_CONCURRENT_FETCHES, len(urls))) as executor:
+        pages = list(executor.map(web_fetch, urls))
+
+    text = "\n\n".join(f"Content of {url}:\n{page}" for url, page in zip(urls, pages))
+    if any(isinstance(page, ToolFailure) for page in pages):
+        return ToolFailure(text)
+    return text
 
 def google_web_search(query: str) -> str:
     """
     Performs a web search using DuckDuckGo (via duckduckgo_search package).
     """
+    key = query.strip().lower()
+    cached = _SEARCH_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    text, ok = _search(query)
+    if not ok:
+        text = ToolFailure(text)
+    _SEARCH_CACHE.set(key, text, ttl=None if ok else _ERROR_TTL)
+    return text
+
+def _search(query: str):
+    """
+    Runs a DuckDuckGo search, returning (text, ok) where ok is False if text
+    is an error message.
+    """
     try:
         from duckduckgo_search import DDGS
         with DDGS() as ddgs:
             results = list(ddgs.text(query, max_results=5))
             
         if not results:
-            return f"No results found for query: {query}"
+            return f"No results found for query: {query}", True
             
         formatted_results = ""
         for i, res in enumerate(results, 1):
             formatted_results += f"{i}. {res.get('title', 'No Title')}\n   URL: {res.get('href', 'No URL')}\n   Snippet: {res.get('body', 'No Snippet')}\n\n"
             
-        return formatted_results
+        return formatted_results, True
         
     except ImportError:
-        return "Error: duckduckgo-search package is not installed. Please run 'pip install duckduckgo-search'."
+        return "Error: duckduckgo-search package is not installed. Please run 'pip install duckduckgo-search'.", False
     except Exception as e:
-        return f"Error performing search: {e}"
\ No newline at end of file
+        return f"Error performing search: {e}", False
+
+def get_cache_stats() -> dict:
+    """Returns size and hit/miss counters for the web tool caches."""
+    return {
+        "page_cache": _WEB_CACHE.get_stats(),
+        "clean_text_cache": _CLEAN_CACHE.get_stats(),
+        "validator_cache": _VALIDATOR_CACHE.get_stats(),
+        "search_cache": _SEARCH_CACHE.get_stats(),
+    }
\ No newline at end of file
@@ -0,0 +1,170 @@
+# src/cache.py
+
+import os
+import time
+import shelve
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class ToolFailure(str):
+    """
+    A tool's description of why it has no result, returned in its place.
+
+    It reads like any other result, but caches shouldn't keep it, since the
+    failure may be transient.
+    """
+
+
+class TTLCache:
+    """A thread-safe LRU cache whose entries expire after a time-to-live."""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the value stored under key, or default if missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_ns, value = entry
+            if time.monotonic_ns() >= expires_ns:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Stores a value, evicting the least recently used entry when full."""
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (time.monotonic_ns() + int(ttl * 1e9), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Removes all entries."""
+        with self._lock:
+            self._data.clear()
+
+    def get_stats(self) -> dict:
+        """Returns the current size and lookup counters."""
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def ttl_cache(maxsize: int = 256, ttl: float = 300.0):
+    """
+    Decorator that memoizes a function's results in a `TTLCache`.
+
+    Falsy results (None, empty lists/dicts) aren't stored, since the query
+    functions also return those on transient API errors. The underlying cache
+    is available as the wrapper's `cache` attribute.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            result = cache.get(key)
+            if result is None:
+                result = func(*args, **kwargs)
+                if result:
+                    cache.set(key, result)
+            return result
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+class PersistentCache:
+    """
+    An on-disk cache backed by `shelve`, whose entries survive restarts.
+
+    Entries expire after a wall-clock time-to-live. The shelf is opened for each
+    operation under a lock, since shelve objects aren't thread-safe, so this is
+    meant for slow remote lookups rather than hot paths. Disk errors are
+    treated as misses.
+    """
+
+    def __init__(self, path: str, ttl: float = 86400.0):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Returns the value stored under key, or default if missing or expired."""
+        with self._lock:
+            try:
+                with shelve.open(self.path) as shelf:
+                    entry = shelf.get(key)
+            except Exception:
+                return default
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if time.time() >= expires_at:
+            return default
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Stores a value, overwriting any existing entry."""
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with shelve.open(self.path) as shelf:
+                    shelf[key] = (time.time() + ttl, value)
+            except Exception:
+                pass
+
+
+_MISSING = object()
+
+
+def persistent_cache(path: str, ttl: float = 86400.0, negative_ttl: Optional[float] = None):
+    """
+    Decorator that memoizes a function's results on disk in a `PersistentCache`.
+
+    Falsy results are only stored when `negative_ttl` is given, and then only
+    for that (usually shorter) time, so a lookup that failed can be retried.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        cache = PersistentCache(path, ttl=ttl)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = repr((args, tuple(sorted(kwargs.items()))))
+            result = cache.get(key, _MISSING)
+            if result is _MISSING:
+                result = func(*args, **kwargs)
+                if result:
+                    cache.set(key, result)
+                elif negative_ttl is not None:
+                    cache.set(key, result, ttl=negative_ttl)
+            return result
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
@@ -0,0 +1,69 @@
+# src/concurrency.py
+
+import queue
+import threading
+from concurrent.futures import Executor, Future
+from typing import Callable, List
+
+
+class DaemonThreadPoolExecutor(Executor):
+    """
+    A thread pool whose workers are daemon threads.
+
+    `ThreadPoolExecutor` joins its workers at interpreter exit, so a Kaggle
+    request or page download still in flight keeps Ctrl-C from quitting until
+    it finishes. Daemon workers are simply abandoned instead. Workers start on
+    demand, up to `max_workers`, and exit once the pool is shut down.
+    """
+
+    def __init__(self, max_workers: int):
+        self._max_workers = max_workers
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._threads: List[threading.Thread] = []
+        self._idle = threading.Semaphore(0)
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            future: Future = Future()
+            self._queue.put((future, fn, args, kwargs))
+            # Reuse an idle worker if there is one
+            if not self._idle.acquire(blocking=False) and len(self._threads) < self._max_workers:
+                thread = threading.Thread(target=self._work, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            return future
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.put(None)  # Pass the shutdown signal on to the next worker
+                return
+            future, fn, args, kwargs = item
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+            del item, future
+            self._idle.release()
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        with self._lock:
+            self._shutdown = True
+            if cancel_futures:
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not None:
+                        item[0].cancel()
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
@@ -1,27 +1,102 @@
 import os
 import re
-import glob
+import queue
+import contextlib
+import heapq
+import json
 import tempfile
-from kaggle.api.kaggle_api_extended import KaggleApi
+import threading
+from collections import Counter
 
-# Initialize API
-api = KaggleApi()
-api.authenticate()
+try:
+    import orjson
+except ImportError:  # Fall back to the standard library decoder
+    orjson = None
+
+try:
+    from kagglesdk.kernels.types.kernels_api_service import ApiGetKernelRequest
+except ImportError:  # Older kaggle clients without the SDK
+    ApiGetKernelRequest = None
+
+from src.cache import persistent_cache, ttl_cache
+from src.concurrency import DaemonThreadPoolExecutor
+
+# Kaggle client, created and authenticated on first use
+_api = None
+_api_lock = threading.Lock()
+
+# Idle SDK clients. Each keeps its HTTP session (and open connections) between
+# requests, so kernel fetches don't pay a new TLS handshake every time.
+_client_pool = queue.SimpleQueue()
+
+# How long query results are reused. Searching and analyzing kernels fetches up
+# to ten kernels each, so those results are kept longer.
+_QUERY_TTL = 300
+_KERNEL_SCAN_TTL = 1800
+
+# Results that rarely change are also kept on disk, so new sessions can reuse them
+_CACHE_DIR = os.environ.get(
+    "KAGGLE_AGENT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "kaggle_agent")
+)
+
+# Slug of a competition URL such as kaggle.com/c/{slug} or kaggle.com/competitions/{slug}
+_KAGGLE_COMP_RE = re.compile(r"kaggle\.com/(?:c|competitions)/([^/?#]+)")
+
+# Top-level package named by an `import x` or `from x import ...` line
+_IMPORT_RE = re.compile(r"^(?:import|from)\s+([A-Za-z_][A-Za-z0-9_]*)", re.MULTILINE)
+
+def _get_api():
+    """
+    Returns the shared, authenticated Kaggle client, creating it on first use.
+    """
+    global _api
+    if _api is None:
+        with _api_lock:
+            if _api is None:
+                try:
+                    # Importing the kaggle package authenticates too, so it is deferred as well
+                    from kaggle.api.kaggle_api_extended import KaggleApi
+
+                    api = KaggleApi()
+                    api.authenticate()
+                except SystemExit:
+                    # The client exits the process when no credentials are found
+                    raise RuntimeError("Kaggle authentication failed. Check your Kaggle API credentials.") from None
+                _api = api
+    return _api
+
+@contextlib.contextmanager
+def _kaggle_client():
+    """
+    Checks out an SDK client from the pool, creating one if none is idle.
+    """
+    try:
+        client = _client_pool.get_nowait()
+    except queue.Empty:
+        client = _get_api().build_kaggle_client()
+    try:
+        yield client
+    finally:
+        _client_pool.put(client)
+
+def get_slug_from_url(url):
+    """Returns the competition slug of a Kaggle competition URL, or None for other URLs."""
+    match = _KAGGLE_COMP_RE.search(url)
+    return match.group(1) if match else None
 
 def get_slug_from_ref(ref_or_url):
     """Extracts slug from a reference or URL."""
-    # If it's a full URL, extract the last part
-    if "kaggle.com/competitions/" in ref_or_url or "kaggle.com/c/" in ref_or_url:
-        return ref_or_url.rstrip('/').split('/')[-1]
-    # If it is a ref like 'titanic', return it
-    return ref_or_url
+    # If it's a full URL, extract the slug; if it is a ref like 'titanic', return it
+    return get_slug_from_url(ref_or_url) or ref_or_url
 
+@ttl_cache(maxsize=256, ttl=_QUERY_TTL)
+@persistent_cache(os.path.join(_CACHE_DIR, "similar_competitions"), ttl=600)
 def find_similar_competitions_query(query, metric=None):
     """
     Queries the Kaggle API for competitions matching the query.
     """
     try:
-        competitions_response = api.competitions_list(search=query)
+        competitions_response = _get_api().competitions_list(search=query)
         # Handle different API response structures (list vs object)
         if hasattr(competitions_response, 'competitions'):
             competitions = competitions_response.competitions
@@ -36,14 +111,24 @@ def find_similar_competitions_query(query, metric=None):
         print(f"Error searching competitions: {e}")
         return []
     
+    # Lowercase the metric filter once rather than on every competition
+    metric_lower = metric.lower() if metric else None
+
+    # Filter by metric if provided
+    matching = (
+        comp for comp in competitions
+        if not metric_lower or metric_lower in (getattr(comp, 'evaluation_metric', '') or '').lower()
+    )
+
+    # Keep the five with the most teams (proxy for popularity) before building any records
+    top_competitions = heapq.nlargest(5, matching, key=lambda comp: getattr(comp, 'team_count', 0))
+
     results = []
-    for comp in competitions:
-        # Filter by metric if provided
-        if metric and metric.lower() not in (getattr(comp, 'evaluation_metric', '') or '').lower():
-            continue
-            
+    for comp in top_competitions:
         # Extract slug. comp.ref might be URL or slug.
         slug = get_slug_from_ref(comp.ref)
+        # Only build the fallback URL when the API didn't provide one
+        url = getattr(comp, 'url', None) or f"https://www.kaggle.com/c/{slug}"
         
         results.append({
             "Id": getattr(comp, 'id', None),
@@ -51,13 +136,11 @@ def find_similar_competitions_query(query, metric=None):
             "Title": comp.title,
             "EvaluationAlgorithmName": getattr(comp, 'evaluation_metric', 'Unknown'),
             "TotalTeams": getattr(comp, 'team_count', 0),
-            "URL": getattr(comp, 'url', f"https://www.kaggle.com/c/{slug}")
+            "URL": url
         })
-    
-    # Sort by team count (proxy for popularity)
-    results = sorted(results, key=lambda x: x['TotalTeams'], reverse=True)[:5]
     return results
 
+@ttl_cache(maxsize=256, ttl=_QUERY_TTL)
 def get_winning_solution_writeups_query(competition_slug):
     """
     Searches for kernels with 'solution' in the title for a given competition.
@@ -65,7 +148,7 @@ def get_winning_solution_writeups_query(competition_slug):
     """
     try:
         # Search for kernels with "solution" in the title
-        kernels = api.kernels_list(competition=competition_slug, search="solution", sort_by="voteCount", page_size=10)
+        kernels = _get_api().kernels_list(competition=competition_slug, search="solution", sort_by="voteCount", page_size=5)
     except Exception as e:
         print(f"Error searching winning solutions: {e}")
         return []
@@ -79,8 +162,9 @@ def get_winning_solution_writeups_query(competition_slug):
             "Author": k.author
         })
     
-    return solutions[:5]
+    return solutions
 
+@ttl_cache(maxsize=256, ttl=_QUERY_TTL)
 def get_top_scoring_kernels_query(competition_slug, language, sort_by):
     """
     Queries for top-scoring kernels.
@@ -92,7 +176,7 @@ def get_top_scoring_kernels_query(competition_slug, language, sort_by):
         api_sort = "score"
         
     try:
-        kernels = api.kernels_list(competition=competition_slug, language=language.lower(), sort_by=api_sort, page_size=5)
+        kernels = _get_api().kernels_list(competition=competition_slug, language=language.lower(), sort_by=api_sort, page_size=5)
     except Exception as e:
         print(f"Error searching top kernels: {e}")
         return []
@@ -107,115 +191,162 @@ def get_top_scoring_kernels_query(competition_slug, language, sort_by):
         })
     return results
 
+@ttl_cache(maxsize=256, ttl=_KERNEL_SCAN_TTL)
 def search_code_snippets_query(keywords, competition_slug=None):
     """
     Searches for code snippets in top kernels.
     """
     try:
         if competition_slug:
-            kernels = api.kernels_list(competition=competition_slug, sort_by="voteCount", page_size=10)
+            kernels = _get_api().kernels_list(competition=competition_slug, sort_by="voteCount", page_size=10)
         else:
-            kernels = api.kernels_list(search=keywords, sort_by="voteCount", page_size=5)
+            kernels = _get_api().kernels_list(search=keywords, sort_by="voteCount", page_size=5)
     except Exception as e:
         print(f"Error searching kernels for snippets: {e}")
         return []
         
     found_snippets = []
-    
-    with tempfile.TemporaryDirectory() as temp_dir:
-        for k in kernels:
+
+    # Kernels are fetched and scanned concurrently
+    executor = DaemonThreadPoolExecutor(max_workers=8)
+    futures = [executor.submit(_search_kernel, k, keywords) for k in kernels]
+    try:
+        # Collect in vote order so the top-ranked matches are kept
+        for future in futures:
             try:
-                # Download kernel code
-                api.kernels_pull(k.ref, path=temp_dir, metadata=False, quiet=True)
-                
-                files = glob.glob(os.path.join(temp_dir, "*"))
-                for file_path in files:
-                    if os.path.isfile(file_path):
-                        content = ""
-                        if file_path.endswith(".ipynb"):
-                            import json
-                            try:
-                                with open(file_path, 'r', errors='ignore') as f:
-                                    notebook = json.load(f)
-                                    for cell in notebook.get('cells', []):
-                                        if cell.get('cell_type') == 'code':
-                                            source_code = "".join(cell.get('source', []))
-                                            # Keep track of cell content for context
-                                            content += source_code + "\n"
-                            except Exception:
-                                pass
-                        else:
-                            with open(file_path, 'r', errors='ignore') as f:
-                                content = f.read()
-
-                        if keywords in content:
-                            # Extract snippet
-                            lines = content.split('\n')
-                            for i, line in enumerate(lines):
-                                if keywords in line:
-                                    snippet = "\n".join(lines[max(0, i - 2) : i + 3])
-                                    found_snippets.append({
-                                        "Title": k.title,
-                                        "URL": f"https://www.kaggle.com/{k.ref}",
-                                        "Snippet": snippet
-                                    })
-                                    break
-                        os.remove(file_path)
-                        
+                found_snippets.extend(future.result())
             except Exception as e:
-                # print(f"Error processing kernel {k.ref}: {e}")
+                # print(f"Error processing kernel: {e}")
                 continue
-                
+
             if len(found_snippets) >= 5:
                 break
-                
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
     return found_snippets
 
+def _fetch_kernel_source(k):
+    """
+    Returns a kernel's source code as (source, is_notebook), without writing it to disk.
+    """
+    if ApiGetKernelRequest is None:
+        return _pull_kernel_source(k)
+
+    # Same request `kernels_pull` makes, minus the round trip through a file
+    owner_slug, _, kernel_slug = k.ref.partition('/')
+    with _kaggle_client() as kaggle:
+        request = ApiGetKernelRequest()
+        request.user_name = owner_slug
+        request.kernel_slug = kernel_slug
+        blob = kaggle.kernels.kernels_api_client.get_kernel(request).blob
+    return blob.source or "", (blob.kernel_type or "").lower() == "notebook"
+
+def _pull_kernel_source(k):
+    """
+    Fallback for Kaggle clients without the SDK: pulls the kernel to a
+    temporary directory and reads it back.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        _get_api().kernels_pull(k.ref, path=temp_dir, metadata=False, quiet=True)
+        # DirEntry caches the file type, so no extra stat per entry
+        for entry in os.scandir(temp_dir):
+            if entry.is_file():
+                with open(entry.path, 'r', errors='ignore') as f:
+                    return f.read(), entry.name.endswith(".ipynb")
+    return "", False
+
+def _notebook_code(source):
+    """
+    Returns the code cells of a notebook's JSON source joined into one string,
+    leaving out markdown and outputs. Uses orjson when it is installed.
+    """
+    notebook = orjson.loads(source) if orjson is not None else json.loads(source)
+    # Keep track of cell content for context
+    return "".join(
+        "".join(cell.get('source', [])) + "\n"
+        for cell in notebook.get('cells', [])
+        if cell.get('cell_type') == 'code'
+    )
+
+def _snippet_around(content, index, context=2):
+    """
+    Returns the line containing content[index] together with `context` lines on
+    either side, without splitting the whole text.
+    """
+    start = content.rfind("\n", 0, index)
+    for _ in range(context):
+        if start < 0:
+            break
+        start = content.rfind("\n", 0, start)
+    end = content.find("\n", index)
+    for _ in range(context):
+        if end < 0:
+            break
+        end = content.find("\n", end + 1)
+    if end < 0:
+        end = len(content)
+    return content[start + 1 : end]
+
+def _search_kernel(k, keywords):
+    """
+    Fetches a kernel and returns the snippet around its first matching line.
+    """
+    source, is_notebook = _fetch_kernel_source(k)
+
+    if is_notebook:
+        # Notebook JSON escapes quotes, backslashes and non-ASCII characters, so the raw
+        # source can only be pre-filtered when the keywords survive JSON encoding unchanged
+        if json.dumps(keywords)[1:-1] == keywords and keywords not in source:
+            return []
+        try:
+            content = _notebook_code(source)
+        except Exception:
+            return []
+    else:
+        content = source.replace("\r\n", "\n")
+
+    index = content.find(keywords)
+    if index < 0:
+        return []
+    return [{
+        "Title": k.title,
+        "URL": f"https://www.kaggle.com/{k.ref}",
+        "Snippet": _snippet_around(content, index)
+    }]
+
+def _kernel_libraries(k):
+    """
+    Fetches a kernel and returns the set of libraries it imports.
+    """
+    source, is_notebook = _fetch_kernel_source(k)
+    if is_notebook:
+        try:
+            source = _notebook_code(source)
+        except Exception:
+            return set() # Skip malformed notebooks
+    return set(_IMPORT_RE.findall(source))
+
+@ttl_cache(maxsize=256, ttl=_KERNEL_SCAN_TTL)
 def analyze_tech_stack_query(competition_slug):
     """
     Analyzes the tech stack of top kernels.
     """
     try:
-        kernels = api.kernels_list(competition=competition_slug, sort_by="voteCount", page_size=10)
+        kernels = _get_api().kernels_list(competition=competition_slug, sort_by="voteCount", page_size=10)
     except Exception as e:
         print(f"Error fetching kernels for tech stack: {e}")
         return {}
         
-    library_counts = {}
+    library_counts = Counter()
     
-    with tempfile.TemporaryDirectory() as temp_dir:
-        for k in kernels:
+    # Kernels are fetched and scanned concurrently
+    with DaemonThreadPoolExecutor(max_workers=8) as executor:
+        futures = [(k, executor.submit(_kernel_libraries, k)) for k in kernels]
+        for k, future in futures:
             try:
-                # Download kernel code
-                api.kernels_pull(k.ref, path=temp_dir, metadata=False, quiet=True)
-                files = glob.glob(os.path.join(temp_dir, "*"))
-                
-                for file_path in files:
-                    if os.path.isfile(file_path):
-                        content = ""
-                        if file_path.endswith(".ipynb"):
-                            import json
-                            try:
-                                with open(file_path, 'r', errors='ignore') as f:
-                                    notebook = json.load(f)
-                                    for cell in notebook.get('cells', []):
-                                        if cell.get('cell_type') == 'code':
-                                            content += "".join(cell.get('source', [])) + "\n"
-                            except Exception:
-                                continue # Skip malformed notebooks
-                        else:
-                             with open(file_path, 'r', errors='ignore') as f:
-                                content = f.read()
-                        
-                        # Find imports
-                        imports = re.findall(
-                            r"^import\s+(\w+)|^from\s+(\w+)", content, re.MULTILINE
-                        )
-                        libs = [item for t in imports for item in t if item]
-                        for lib in set(libs):
-                            library_counts[lib] = library_counts.get(lib, 0) + 1
-                        
-                        os.remove(file_path)
+                # Count each library once per kernel
+                library_counts.update(future.result())
             except Exception as e:
                 print(f"Error analyzing kernel {k.ref}: {e}")
                 continue
@@ -224,32 +355,36 @@ def analyze_tech_stack_query(competition_slug):
     if total_kernels == 0:
         return {}
 
-    return {lib: count / total_kernels for lib, count in library_counts.items()}
+    # most_common() yields the libraries already ordered by frequency
+    return {lib: count / total_kernels for lib, count in library_counts.most_common()}
 
+@ttl_cache(maxsize=256, ttl=_QUERY_TTL)
+# Slugs are stable: known ones are kept for a day, unknown ones rechecked after an hour
+@persistent_cache(os.path.join(_CACHE_DIR, "competition_slugs"), ttl=86400, negative_ttl=3600)
 def get_competition_id_from_slug_query(slug):
     """
     Verifies if a competition slug exists and returns it.
+
+    Returns None only when Kaggle's competition list has no match; if that
+    lookup fails too, its error is raised so the miss isn't cached.
     """
     try:
         # Try to list kernels for this slug to verify it exists and is accessible
         # api.competitions_list(search=slug) is unreliable for exact match
-        api.kernels_list(competition=slug, page_size=1)
+        _get_api().kernels_list(competition=slug, page_size=1)
         return slug
     except Exception:
         # If listing kernels fails, it might not exist or we can't access it.
         # Fallback: check competitions list
-        try:
-             comps_response = api.competitions_list(search=slug)
-             if hasattr(comps_response, 'competitions'):
-                 comps = comps_response.competitions
-             elif isinstance(comps_response, list):
-                 comps = comps_response
-             else:
-                 comps = []
-                 
-             for c in comps:
-                 if get_slug_from_ref(c.ref).lower() == slug.lower():
-                     return slug
-        except Exception:
-            pass
+        comps_response = _get_api().competitions_list(search=slug)
+        if hasattr(comps_response, 'competitions'):
+            comps = comps_response.competitions
+        elif isinstance(comps_response, list):
+            comps = comps_response
+        else:
+            comps = []
+
+        for c in comps:
+            if get_slug_from_ref(c.ref).lower() == slug.lower():
+                return slug
         return None
\ No newline at end of file
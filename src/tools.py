@@ -8,10 +8,16 @@ from src.kaggle_api import (
     search_code_snippets_query,
     analyze_tech_stack_query,
     get_competition_id_from_slug_query,
+    get_slug_from_url,
 )
 from src.built_in_tools import web_fetch  # Import web_fetch
+from src.cache import ToolFailure, TTLCache
+from src.concurrency import DaemonThreadPoolExecutor
 import re
 
+# Competition summaries keyed by slug; only complete ones are stored
+_summary_cache = TTLCache(maxsize=64, ttl=900)
+
 
 def find_similar_competitions(query: str, metric: str = None):
     """
@@ -25,7 +31,7 @@ def find_similar_competitions(query: str, metric: str = None):
     result = find_similar_competitions_query(query, metric)
 
     if not result:
-        return f"No similar competitions found for query: '{query}'"
+        return ToolFailure(f"No similar competitions found for query: '{query}'")
 
     return f"Found similar competitions: {result}"
 
@@ -37,9 +43,12 @@ def get_winning_solution_writeups(competition_slug: str):
 
     print(f"Getting winning solution write-ups for competition: {competition_slug}")
     result = get_winning_solution_writeups_query(competition_slug)
+    return _format_writeups(competition_slug, result)
+
 
+def _format_writeups(competition_slug: str, result):
     if not result:
-        return (
+        return ToolFailure(
             f"No winning solution write-ups found for competition: {competition_slug}"
         )
 
@@ -57,9 +66,14 @@ def get_top_scoring_kernels(
         f"Getting top scoring kernels for competition: {competition_slug}, language: '{language}', sort_by: '{sort_by}'"
     )
     result = get_top_scoring_kernels_query(competition_slug, language, sort_by)
+    return _format_kernels(competition_slug, result)
+
 
+def _format_kernels(competition_slug: str, result):
     if not result:
-        return f"No top scoring kernels found for competition: {competition_slug}"
+        return ToolFailure(
+            f"No top scoring kernels found for competition: {competition_slug}"
+        )
 
     return f"Found top scoring kernels: {result}"
 
@@ -76,7 +90,7 @@ def search_code_snippets(keywords: str, competition_slug: str = None):
     result = search_code_snippets_query(keywords, competition_slug)
 
     if not result:
-        return f"No code snippets found for keywords: '{keywords}'"
+        return ToolFailure(f"No code snippets found for keywords: '{keywords}'")
 
     return f"Found code snippets: {result}"
 
@@ -99,7 +113,7 @@ def get_competition_id_from_url(url: str):
         else:
             return "Invalid Kaggle competition URL format."
     except Exception as e:
-        return f"An error occurred while parsing the URL: {e}"
+        return ToolFailure(f"An error occurred while parsing the URL: {e}")
 
 
 def analyze_tech_stack(competition_slug: str):
@@ -109,41 +123,60 @@ def analyze_tech_stack(competition_slug: str):
 
     print(f"Analyzing tech stack for competition: {competition_slug}")
     result = analyze_tech_stack_query(competition_slug)
+    return _format_tech_stack(competition_slug, result)
+
 
+def _format_tech_stack(competition_slug: str, result):
     if not result:
-        return f"Could not analyze tech stack for competition: {competition_slug}"
+        return ToolFailure(
+            f"Could not analyze tech stack for competition: {competition_slug}"
+        )
 
     # Sort by frequency for better readability
     sorted_stack = sorted(result.items(), key=lambda item: item[1], reverse=True)
     return f"Tech stack analysis (library: usage_frequency): {sorted_stack}"
 
+def _summarize_competition(comp_slug: str):
+    """Builds a competition summary from the specialized queries, reusing it for repeat requests."""
+    summary = _summary_cache.get(comp_slug)
+    if summary is not None:
+        return summary
+
+    # The queries make independent Kaggle requests, so they run concurrently.
+    with DaemonThreadPoolExecutor(max_workers=3) as executor:
+        solutions_future = executor.submit(get_winning_solution_writeups_query, comp_slug)
+        kernels_future = executor.submit(
+            get_top_scoring_kernels_query, comp_slug, "Python", "Votes"
+        )
+        tech_stack_future = executor.submit(analyze_tech_stack_query, comp_slug)
+        solutions = solutions_future.result()
+        kernels = kernels_future.result()
+        tech_stack = tech_stack_future.result()
+    
+    summary = (
+        f"Summary for competition {comp_slug}:\n"
+        f"Top Solutions: {_format_writeups(comp_slug, solutions)}\n"
+        f"Top Kernels: {_format_kernels(comp_slug, kernels)}\n"
+        f"Tech Stack: {_format_tech_stack(comp_slug, tech_stack)}"
+    )
+    # The queries also come back empty on API errors, so a summary with a
+    # missing section isn't kept
+    if not (solutions and kernels and tech_stack):
+        return ToolFailure(summary)
+    _summary_cache.set(comp_slug, summary)
+    return summary
+
 def summarize_url_content(url: str):
     """Fetches and summarizes the content of a URL. If it's a Kaggle competition URL, it will use specialized tools."""
     print(f"Fetching and summarizing URL: {url}")
     
-    # Check if it's a Kaggle competition URL
-    if "kaggle.com/c/" in url or "kaggle.com/competitions/" in url:
+    # Check if it's a Kaggle competition URL, extracting the slug in the same pass
+    comp_slug = get_slug_from_url(url)
+    if comp_slug:
         print("Kaggle URL detected. Using specialized tools for a detailed summary.")
         
-        # Extract slug directly here instead of calling the other tool and parsing NL
         try:
-            path = urlparse(url).path
-            parts = path.strip("/").split("/")
-            if len(parts) > 1 and parts[0] in ["c", "competitions"]:
-                comp_slug = parts[1]
-                
-                # Orchestrate the other tools to build a summary
-                solutions = get_winning_solution_writeups(comp_slug)
-                kernels = get_top_scoring_kernels(comp_slug)
-                tech_stack = analyze_tech_stack(comp_slug)
-                
-                summary = (
-                    f"Summary for competition {comp_slug}:\n"
-                    f"Top Solutions: {solutions}\n"
-                    f"Top Kernels: {kernels}\n"
-                    f"Tech Stack: {tech_stack}"
-                )
-                return summary
+            return _summarize_competition(comp_slug)
         except Exception as e:
             print(f"Error extracting slug or summarizing specialized content: {e}")
             # Fallback to general search below
@@ -155,7 +188,7 @@ def summarize_url_content(url: str):
     # Try generic web fetch first
     content = web_fetch(prompt=f"Get the content of {url}")
     
-    if "Error" not in content and len(content) > 100:
+    if not isinstance(content, ToolFailure) and len(content) > 100:
         return content
     else:
         # Fallback to Google Search if direct fetch fails (common for protected pages like Kaggle)
@@ -168,4 +201,6 @@ def summarize_url_content(url: str):
              query = f"{url} winning solutions top kernels approach"
              
         search_results = google_web_search(query=query)
-        return f"Direct access to the page was restricted. Here is what I found via search:\n{search_results}"
\ No newline at end of file
+        return ToolFailure(
+            f"Direct access to the page was restricted. Here is what I found via search:\n{search_results}"
+        )
\ No newline at end of file